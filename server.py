@@ -1,103 +1,548 @@
 #!/usr/bin/env python3
 import os
+import asyncio
+import logging
 import re
 import textwrap
 import subprocess
+import tempfile
+import threading
+import functools
+import codecs
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from fastmcp import FastMCP
-from openai import OpenAI
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+try:  # optional: in-process (libgit2) reads instead of forking git
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+try:  # optional: SIMD multi-pattern scanning for secret redaction
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# optional: lets httpx speak HTTP/2 to the OpenAI API (checked without importing it)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
 
 # ----- Configuration -----
 APP_NAME = "commit-buddy"
 MAX_DIFF_CHARS = int(os.getenv("COMMIT_BUDDY_MAX_DIFF_CHARS", "200000"))
-ALLOWED_ROOTS = [Path(p).resolve() for p in os.getenv("COMMIT_BUDDY_ALLOWED_ROOTS", "").split(":") if p.strip()]
+ALLOWED_ROOTS_RAW = [p for p in os.getenv("COMMIT_BUDDY_ALLOWED_ROOTS", "").split(":") if p.strip()]
 DEFAULT_OPENAI_MODEL = os.getenv("COMMIT_BUDDY_OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_TEMPERATURE = float(os.getenv("COMMIT_BUDDY_TEMPERATURE", "0.2"))
+STREAM_CHUNK_BYTES = 64 * 1024
+# Extra chars read past the limit so a secret straddling the cut is still redacted
+REDACT_SLACK_CHARS = 4096
+DIFF_TRUNCATED_NOTE = "\n[commit-buddy] Diff truncated for size.\n"
+# Above this many changed lines, only -U0 hunks of the most-changed files are fetched
+LARGE_DIFF_LINES = int(os.getenv("COMMIT_BUDDY_LARGE_DIFF_LINES", "5000"))
+LARGE_DIFF_TOP_FILES = int(os.getenv("COMMIT_BUDDY_LARGE_DIFF_TOP_FILES", "20"))
 
 SECRET_PATTERNS = [
-    (re.compile(r'(?i)aws[_-]?secret[_-]?access[_-]?key\s*=\s*([A-Za-z0-9/+=]{20,})'), 'aws_secret_access_key=***'),
-    (re.compile(r'(?i)api[_-]?key\s*=\s*([A-Za-z0-9_-]{16,})'), 'api_key=***'),
-    (re.compile(r'(?i)authorization:\s*Bearer\s+[A-Za-z0-9._-]{16,}'), 'authorization: Bearer ***'),
-    (re.compile(r'(?i)password\s*=\s*[^ \n]+'), 'password=***'),
-    (re.compile(r'(?i)secret\s*=\s*[^ \n]+'), 'secret=***'),
+    (re.compile(r'aws[_-]?secret[_-]?access[_-]?key\s*=\s*([A-Za-z0-9/+=]{20,})', re.IGNORECASE), 'aws_secret_access_key=***'),
+    (re.compile(r'api[_-]?key\s*=\s*([A-Za-z0-9_-]{16,})', re.IGNORECASE), 'api_key=***'),
+    (re.compile(r'authorization:\s*Bearer\s+[A-Za-z0-9._-]{16,}', re.IGNORECASE), 'authorization: Bearer ***'),
+    (re.compile(r'password\s*=\s*[^ \n]+', re.IGNORECASE), 'password=***'),
+    (re.compile(r'secret\s*=\s*[^ \n]+', re.IGNORECASE), 'secret=***'),
+]
+# The key part each pattern above starts with (same order). Each ends on a fixed
+# character, so a Hyperscan scan reports one match per occurrence, not one per value byte.
+# Only used on ASCII text, where str's \s also covers \x1c-\x1f; the class is widened to match.
+_WS = r'[\s\x1c-\x1f]'
+_SECRET_KEY_PREFIXES = [
+    rf'aws[_-]?secret[_-]?access[_-]?key{_WS}*=',
+    rf'api[_-]?key{_WS}*=',
+    rf'authorization:{_WS}*Bearer{_WS}',
+    rf'password{_WS}*=',
+    rf'secret{_WS}*=',
 ]
+# All patterns fused into one alternation: a single scan finds the first secret, if any.
+# It only locates; the replacements still run pattern by pattern (see redact_secrets).
+_SECRET_RE = re.compile("|".join(f"(?:{pat.pattern})" for pat, _ in SECRET_PATTERNS), re.IGNORECASE)
+
+def _compile_secret_db():
+    if hyperscan is None:
+        return None
+    try:
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        # Key prefixes only: the value classes ([^ \n]+, {16,}) would produce a callback
+        # for every end offset of a long value
+        db.compile(
+            expressions=[key.encode() for key in _SECRET_KEY_PREFIXES],
+            ids=list(range(len(_SECRET_KEY_PREFIXES))),
+            elements=len(_SECRET_KEY_PREFIXES),
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST] * len(_SECRET_KEY_PREFIXES),
+        )
+    except hyperscan.error:
+        return None  # fall back to the re-based scan
+    return db
+
+# Hyperscan finds the first key in one DFA pass; re starts there instead of at char 0
+_SECRET_DB = _compile_secret_db()
+# The database owns a single scratch space, so scans must not overlap
+_SECRET_DB_LOCK = threading.Lock()
+
+# Surrounding whitespace and stray code-fence backticks in model output
+_MESSAGE_TRIM_RE = re.compile(r"\A[\s`]+|[\s`]+\Z")
+
+SYSTEM_PROMPT = "You are a senior engineer who writes excellent Conventional Commits."
+# Plain dict with str content, built once; the SDK passes it through as-is
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+USER_PROMPT_TEMPLATE = textwrap.dedent("""\
+    Generate a clear, **Conventional Commits** style commit message based on the unified git diff below.
+
+    Requirements:
+    - Start with a conventional type (feat, fix, docs, style, refactor, test, chore, perf, build, ci).
+    - A concise subject line (≤ 72 chars).
+    - Optional body lines with bullet points summarizing key changes.
+    - No code fences in the output. Plain text only.
+    - If the changes are trivial (whitespace, typos), use "chore:" or "style:" accordingly.
+    - {lang_clause}
+
+    Git diff (large diffs are summarized per file as "path: +added -removed" followed by the most relevant hunks):
+    {diff}
+    """)
+
+DRY_RUN_TEMPLATE = textwrap.dedent("""\
+    [commit-buddy] DRY RUN
+    Branch: {branch}
+    Remote: {remote}
+    Message:
+    {message}
+    (No commit/push executed.)
+    """)
 
 mcp = FastMCP(APP_NAME)
+# Never print diagnostics: stdout carries the MCP stdio protocol
+logger = logging.getLogger(APP_NAME)
+
+# Reused across calls so the HTTP connection pool (and TLS sessions) stay warm.
+# Stored as (api_key, client) so both are swapped atomically if the key changes.
+_openai_client: Optional[Tuple[str, "OpenAI"]] = None
+_openai_client_lock = threading.Lock()
+# Builds the client in the background while git produces the diff
+_warmup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="commit-buddy-warmup")
+# Strong refs to in-flight background pushes; asyncio only keeps weak ones
+_background_pushes = set()
 
 # ----- Helpers -----
+@functools.lru_cache(maxsize=None)
+def allowed_roots() -> List[Path]:
+    # Resolved on first use so startup doesn't stat the filesystem
+    return [Path(p).resolve() for p in ALLOWED_ROOTS_RAW]
+
+@functools.lru_cache(maxsize=128)
+def _is_allowed_path(path: str) -> bool:
+    p = Path(path)
+    return any(p.is_relative_to(root) for root in allowed_roots())
+
 def check_allowed(path: Path) -> None:
-    if not ALLOWED_ROOTS:
+    if not ALLOWED_ROOTS_RAW:
         return  # no restriction configured
     # Ensure the repo (or subdir) is inside at least one allowed root
-    if not any(str(path).startswith(str(root)) for root in ALLOWED_ROOTS):
+    if not _is_allowed_path(str(path)):
         raise RuntimeError(
             f"Path {path} is not in COMMIT_BUDDY_ALLOWED_ROOTS. "
             "Set COMMIT_BUDDY_ALLOWED_ROOTS to allow this repo."
         )
 
+def _git_env() -> dict:
+    # No optional index lock/refresh on read commands, and untranslated git messages
+    return {**os.environ, "GIT_OPTIONAL_LOCKS": "0", "LC_ALL": "C"}
+
 def run_git(args, cwd: Path) -> str:
-    result = subprocess.run(["git"] + args, cwd=cwd, capture_output=True, text=True)
+    result = subprocess.run(["git"] + args, cwd=cwd, capture_output=True, env=_git_env())
     if result.returncode != 0:
-        raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
-    return result.stdout.strip()
+        stderr = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"git {' '.join(args)} failed: {stderr}")
+    return result.stdout.decode("utf-8", errors="replace").strip()
+
+async def run_git_async(args, cwd: Path) -> str:
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=_git_env()
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {stderr.decode('utf-8', errors='replace').strip()}")
+    return stdout.decode("utf-8", errors="replace").strip()
+
+def run_git_streamed(args, cwd: Path, max_chars: int) -> Tuple[str, bool]:
+    """Run git, decoding stdout until max_chars characters are read. Returns (output, truncated)."""
+    # stderr goes to a file, not a pipe: nothing reads it until stdout is done, and a full
+    # stderr pipe (e.g. thousands of CRLF warnings) would block git and us with it
+    with tempfile.TemporaryFile() as errfile:
+        proc = subprocess.Popen(
+            ["git"] + args, cwd=cwd, stdout=subprocess.PIPE, stderr=errfile, env=_git_env()
+        )
+        # Decoded as it streams, so the cap counts characters and not UTF-8 bytes
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pieces = []
+        n_chars = 0
+        truncated = False
+        with proc.stdout:
+            while True:
+                chunk = proc.stdout.read(STREAM_CHUNK_BYTES)
+                piece = decoder.decode(chunk, final=not chunk)
+                pieces.append(piece)
+                n_chars += len(piece)
+                if n_chars > max_chars:
+                    # Enough for the caller; stop git instead of buffering the rest of the output
+                    truncated = True
+                    proc.terminate()
+                    break
+                if not chunk:
+                    break
+        proc.wait()
+        if not truncated and proc.returncode != 0:
+            errfile.seek(0)
+            stderr = errfile.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"git {' '.join(args)} failed: {stderr}")
+    return "".join(pieces)[:max_chars].strip(), truncated
+
+@functools.lru_cache(maxsize=32)
+def _verify_repo(path: str) -> None:
+    # Repos don't move during a session, so each path is checked once; failures aren't cached
+    if pygit2 is not None:
+        if pygit2.discover_repository(path) is None:
+            raise RuntimeError(f"git rev-parse --show-toplevel failed: not a git repository: {path}")
+        return
+    _ = run_git(["rev-parse", "--show-toplevel"], cwd=Path(path))
+
+@functools.lru_cache(maxsize=32)
+def _pg_repo(path: str) -> "pygit2.Repository":
+    return pygit2.Repository(pygit2.discover_repository(path))
 
 def ensure_repo(path: str) -> Path:
     p = Path(path).resolve()
     check_allowed(p)
     # confirm we're inside a git repo
-    _ = run_git(["rev-parse", "--show-toplevel"], cwd=p)
+    _verify_repo(str(p))
     return p
 
-def redact_secrets(text: str) -> str:
-    redacted = text
-    for pat, replacement in SECRET_PATTERNS:
+def _redact_sequential(text, start: int, patterns):
+    # Patterns run one after another, as a single alternation would let an earlier match
+    # swallow a later secret's key and leave its value behind. Nothing before `start` (the
+    # first match of the fused regex) can match, so only the tail is rewritten.
+    redacted = text[start:]
+    for pat, replacement in patterns:
         redacted = pat.sub(replacement, redacted)
-    return redacted
+    return text[:start] + redacted
+
+def _first_key_start(text: str) -> Optional[int]:
+    # Hyperscan works on bytes with ASCII-only \s and case folding, which only agrees with
+    # str regex semantics (Unicode spaces, 'ſ' ~ 's', ...) when the text is pure ASCII
+    if _SECRET_DB is None or not text.isascii():
+        return 0
+    key_starts = []
+    def on_match(_id, start, _end, _flags, _context):
+        key_starts.append(start)
+    with _SECRET_DB_LOCK:
+        _SECRET_DB.scan(text.encode("ascii"), match_event_handler=on_match)
+    # Every secret starts with one of the key prefixes
+    return min(key_starts) if key_starts else None
 
-def get_current_branch(cwd: Path) -> str:
-    return run_git(["rev-parse", "--abbrev-ref", "HEAD"], cwd=cwd)
+def redact_secrets(text: str) -> str:
+    start = _first_key_start(text)
+    m = _SECRET_RE.search(text, start) if start is not None else None
+    if m is None:
+        return text  # the common case: one scan, no copies
+    return _redact_sequential(text, m.start(), SECRET_PATTERNS)
 
-def has_remote(cwd: Path, remote: str) -> bool:
-    remotes = run_git(["remote"], cwd=cwd).splitlines()
-    return remote in remotes
+def summarize_diff(diff: str, per_file_budget: int = 800, total_budget: int = 8000) -> str:
+    """Condense a unified diff to per-file +/- counts plus the most relevant hunks.
 
-def openai_generate_commit_message(diff: str, language: Optional[str], model: str, temperature: float) -> str:
+    Lines before the first file header (e.g. the large-diff numstat header) are kept as-is.
+    Diffs that already fit in total_budget are returned unchanged.
+    """
+    if len(diff) <= total_budget:
+        return diff
+
+    # One pass: [path, added, removed, hunks], each hunk a list of lines
+    preamble = []
+    files = []
+    current = None
+    hunk = None
+    for line in diff.splitlines():
+        if line.startswith("diff --git "):
+            header = line[len("diff --git "):]
+            path = header.split(" b/", 1)[1] if " b/" in header else header
+            current = [path, 0, 0, []]
+            files.append(current)
+            hunk = None
+        elif current is None:
+            preamble.append(line)
+        elif line.startswith("@@"):
+            hunk = [line]
+            current[3].append(hunk)
+        elif hunk is not None:
+            if line.startswith("+"):
+                current[1] += 1
+            elif line.startswith("-"):
+                current[2] += 1
+            hunk.append(line)
+
+    def touches_code(h) -> bool:
+        return any(l[:1] in "+-" and l[1:].strip() for l in h[1:])
+
+    def units(h):
+        # A run of -/+ lines is one unit so a change is never cut between its old and new side
+        run = []
+        for l in h:
+            if l[:1] in "+-":
+                if run and run[-1][:1] == "+" and l[:1] == "-":
+                    yield run
+                    run = []
+                run.append(l)
+                continue
+            if run:
+                yield run
+                run = []
+            yield [l]
+        if run:
+            yield run
+
+    parts = []
+    used = 0
+    for line in preamble:
+        if used + len(line) > total_budget:
+            break
+        parts.append(line)
+        used += len(line) + 1
+
+    # Reserve every file's stat line before any hunk so later files are not crowded out
+    stats = [f"{path}: +{added} -{removed}" for path, added, removed, _ in files]
+    kept = len(stats)
+    while kept and used + sum(len(st) + 1 for st in stats[:kept]) > total_budget:
+        kept -= 1
+    if kept < len(stats):
+        omitted = f"[commit-buddy] {len(stats) - kept} more file(s) omitted."
+        while kept and used + sum(len(st) + 1 for st in stats[:kept]) + len(omitted) > total_budget:
+            kept -= 1
+            omitted = f"[commit-buddy] {len(stats) - kept} more file(s) omitted."
+        used += len(omitted) + 1
+    used += sum(len(st) + 1 for st in stats[:kept])
+
+    for stat, (_, _, _, hunks) in zip(stats[:kept], files):
+        parts.append(stat)
+        # Hunks with non-whitespace edits first; sorted() keeps file order otherwise
+        budget = min(per_file_budget, total_budget - used)
+        ranked = sorted(hunks, key=lambda h: not touches_code(h))
+        for unit in (u for h in ranked for u in units(h)):
+            size = sum(len(l) + 1 for l in unit)
+            if size > budget:
+                break
+            parts.extend(unit)
+            budget -= size
+            used += size
+    if kept < len(stats):
+        parts.append(omitted)
+    return "\n".join(parts)
+
+def _pg_repo_state(cwd: Path) -> Tuple[str, Optional[str], bool]:
+    repo = _pg_repo(str(cwd))
+    upstream = None
+    if repo.head_is_detached:
+        branch = "HEAD"
+    else:
+        # HEAD is symbolic here; reading its target also works on an unborn branch
+        branch = repo.lookup_reference("HEAD").target
+        branch = branch[len("refs/heads/"):] if branch.startswith("refs/heads/") else branch
+        # Read from config like `git status` does, so a pruned tracking ref still counts
+        try:
+            merge = repo.config[f"branch.{branch}.merge"]
+            upstream = f"{repo.config[f'branch.{branch}.remote']}/{merge[len('refs/heads/'):]}"
+        except KeyError:
+            pass
+    return branch, upstream, bool(repo.status())
+
+def get_repo_state(cwd: Path) -> Tuple[str, Optional[str], bool]:
+    """Return (current_branch, upstream, has_changes) from a single `git status` call."""
+    if pygit2 is not None:
+        return _pg_repo_state(cwd)
+    out = run_git(["-c", "color.ui=false", "status", "--porcelain=v2", "--branch"], cwd=cwd)
+    branch, upstream, has_changes = "HEAD", None, False
+    for line in out.splitlines():
+        if line.startswith("# branch.head "):
+            head = line[len("# branch.head "):]
+            branch = "HEAD" if head == "(detached)" else head
+        elif line.startswith("# branch.upstream "):
+            upstream = line[len("# branch.upstream "):]
+        elif line and not line.startswith("#"):
+            has_changes = True
+    return branch, upstream, has_changes
+
+def _get_openai_client() -> "OpenAI":
+    global _openai_client
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY is not set. Cannot generate commit message.")
-    client = OpenAI(api_key=api_key)
-
-    system_prompt = "You are a senior engineer who writes excellent Conventional Commits."
-    user_prompt = textwrap.dedent(f"""
-    Generate a clear, **Conventional Commits** style commit message based on the unified git diff below.
-
-    Requirements:
-    - Start with a conventional type (feat, fix, docs, style, refactor, test, chore, perf, build, ci).
-    - A concise subject line (≤ 72 chars).
-    - Optional body lines with bullet points summarizing key changes.
-    - No code fences in the output. Plain text only.
-    - If the changes are trivial (whitespace, typos), use "chore:" or "style:" accordingly.
-    - {"Write it in " + language + "." if language else "Write in English."}
+    cached = _openai_client
+    if cached is not None and cached[0] == api_key:
+        return cached[1]
+    with _openai_client_lock:
+        # Re-check under the lock; another thread may have built it already
+        if _openai_client is None or _openai_client[0] != api_key:
+            # Imported here: openai pulls in httpx and pydantic, which the git-only tools never need
+            from openai import DefaultHttpxClient, OpenAI
+            # DefaultHttpxClient keeps the SDK's timeouts and pool limits
+            http_client = DefaultHttpxClient(http2=True) if HTTP2_AVAILABLE else None
+            _openai_client = (api_key, OpenAI(api_key=api_key, http_client=http_client))
+        return _openai_client[1]
+
+@functools.lru_cache(maxsize=32)
+def _lang_clause(language: Optional[str]) -> str:
+    return f"Write it in {language}." if language else "Write in English."
 
-    Git diff:
-    {diff}
-    """)
+def openai_generate_commit_message(diff: str, language: Optional[str], model: str, temperature: float) -> str:
+    client = _get_openai_client()
+    user_prompt = USER_PROMPT_TEMPLATE.format(lang_clause=_lang_clause(language), diff=summarize_diff(diff))
 
-    resp = client.chat.completions.create(
+    stream = client.chat.completions.create(
         model=model,
         temperature=temperature,
+        presence_penalty=0,
         messages=[
-            {"role": "system", "content": system_prompt},
+            SYSTEM_MESSAGE,
             {"role": "user", "content": user_prompt}
         ],
         max_tokens=220,
+        stream=True,
     )
-    msg = resp.choices[0].message.content.strip()
-    # Defensive: strip surrounding quotes or code fences if any slipped in
-    msg = msg.strip().strip("`").strip()
-    return msg
+    pieces = []
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            pieces.append(chunk.choices[0].delta.content)
+    # Defensive: strip surrounding whitespace and code fences if any slipped in
+    return _MESSAGE_TRIM_RE.sub("", "".join(pieces))
+
+def _diff_stats(
+    repo: Path, staged_only: bool, filter_path: Optional[str] = None
+) -> Tuple[int, int, List[Tuple[str, int, int, Optional[str]]]]:
+    """Return (added, removed, files) from `git diff --numstat`, files sorted by lines changed.
+
+    Each file is (path, added, removed, old_path); old_path is set for renames and copies.
+    """
+    args = ["diff", "--numstat", "-z"]
+    if staged_only:
+        args.insert(1, "--staged")
+    if filter_path:
+        args.append(filter_path)
+    # -z records: "A\tD\tpath\0", or "A\tD\t\0src\0dst\0" for renames
+    fields = run_git(args, cwd=repo).split("\0")
+    files = []
+    i = 0
+    while i < len(fields):
+        parts = fields[i].split("\t")
+        i += 1
+        if len(parts) != 3:
+            continue
+        a, d, path = parts
+        old_path = None
+        if not path:  # rename/copy: source then destination
+            old_path = fields[i] if i < len(fields) else ""
+            path = fields[i + 1] if i + 1 < len(fields) else ""
+            i += 2
+        # Binary files report "-" for both counts
+        files.append((path, int(a) if a.isdigit() else 0, int(d) if d.isdigit() else 0, old_path))
+    files.sort(key=lambda f: f[1] + f[2], reverse=True)
+    return sum(f[1] for f in files), sum(f[2] for f in files), files
+
+def _prepare_diff_for_llm(
+    repo: Path,
+    staged_only: bool,
+    max_chars: int,
+    context_lines: Optional[int] = None,
+    filter_path: Optional[str] = None,
+) -> str:
+    """Fetch a bounded, redacted diff capped at max_chars. Empty string if there are no changes."""
+    args = ["diff", "--no-color", "--no-ext-diff"]
+    if staged_only:
+        args.insert(1, "--staged")
+
+    # Cheap numstat first: a huge change set would only be truncated anyway
+    header = ""
+    added, removed, files = _diff_stats(repo, staged_only, filter_path)
+    if added + removed > LARGE_DIFF_LINES:
+        top = files[:LARGE_DIFF_TOP_FILES]
+        header = "".join(
+            [f"[commit-buddy] Large diff: +{added} -{removed} across {len(files)} file(s); "
+             f"showing -U0 hunks for the {len(top)} most-changed.\n"]
+            + [f"{old + ' => ' if old else ''}{path}: +{a} -{d}\n" for path, a, d, old in top]
+        )
+        # Renames need both sides in the pathspec, or git shows the destination as a new file.
+        # numstat paths are relative to the repo root, and repo may be a subdirectory.
+        pathspecs = []
+        for path, _, _, old in top:
+            pathspecs += [f":(top,literal){p}" for p in ((old, path) if old else (path,))]
+        args += ["-U0", "--"] + pathspecs
+    else:
+        if context_lines is not None:
+            args.append(f"-U{context_lines}")
+        if filter_path:
+            args.append(filter_path)
+
+    raw, truncated = run_git_streamed(args, cwd=repo, max_chars=max_chars + REDACT_SLACK_CHARS)
+    if not raw:
+        return ""
+    diff = header + redact_secrets(raw)
+    if truncated or len(diff) > max_chars:
+        diff = diff[:max_chars] + DIFF_TRUNCATED_NOTE
+    return diff
+
+def _generate_from_repo(
+    repo: Path,
+    staged_only: bool,
+    language: Optional[str],
+    model: Optional[str],
+    temperature: Optional[float],
+) -> Optional[str]:
+    """Generate a commit message for the repo's diff. None if there are no changes."""
+    client_future = _warmup_executor.submit(_get_openai_client)
+    diff = _prepare_diff_for_llm(repo, staged_only, MAX_DIFF_CHARS)
+    if not diff:
+        return None
+    logger.debug("diff length=%d", len(diff))
+
+    client_future.result()  # surfaces a missing OPENAI_API_KEY
+    mdl = model or DEFAULT_OPENAI_MODEL
+    temp = OPENAI_TEMPERATURE if temperature is None else float(temperature)
+    return openai_generate_commit_message(diff=diff, language=language, model=mdl, temperature=temp)
+
+async def _push(repo: Path, remote: str, branch: str, upstream: Optional[str]) -> None:
+    # git validates the remote itself; only set tracking when there is none, so an
+    # existing upstream is never re-pointed at this remote
+    args = ["push", remote, branch] if upstream else ["push", "--set-upstream", remote, branch]
+    try:
+        await run_git_async(args, cwd=repo)
+    except RuntimeError as e:
+        if f"'{remote}' does not appear to be a git repository" in str(e):
+            raise RuntimeError(f"Remote '{remote}' not found. Add it with 'git remote add {remote} <url>'.") from e
+        raise
+
+async def _push_in_background(
+    repo: Path, remote: str, branch: str, upstream: Optional[str], log_path: Path
+) -> None:
+    try:
+        await _push(repo, remote, branch, upstream)
+    except asyncio.CancelledError:
+        # Server shutting down mid-push; written directly since we can't await here
+        log_path.write_text(
+            f"[commit-buddy] Push to {remote}/{branch} interrupted: the server stopped before it finished. "
+            f"Check with 'git status' and push again if needed.\n"
+        )
+        raise
+    except Exception as e:
+        await asyncio.to_thread(log_path.write_text, f"[commit-buddy] Push to {remote}/{branch} failed: {e}\n")
+    else:
+        await asyncio.to_thread(log_path.write_text, f"[commit-buddy] Pushed to {remote}/{branch}.\n")
 
 # ----- Tools -----
 # The default setting is to only show staged changes.
@@ -111,20 +556,10 @@ def get_git_diff(
 ) -> str:
     """Return a (redacted) unified git diff. Use staged_only=true to only show staged changes."""
     repo = ensure_repo(path)
-    args = ["diff", f"-U{context_lines}"]
-    if staged_only:
-        args.insert(1, "--staged")
-    if filter_path:
-        args.append(filter_path)
-
-    diff = run_git(args, cwd=repo)
+    limit = max_chars if (isinstance(max_chars, int) and max_chars > 0) else MAX_DIFF_CHARS
+    diff = _prepare_diff_for_llm(repo, staged_only, limit, context_lines=context_lines, filter_path=filter_path)
     if not diff:
         return "[commit-buddy] No changes detected (diff is empty)."
-
-    diff = redact_secrets(diff)
-    limit = max_chars if (isinstance(max_chars, int) and max_chars > 0) else MAX_DIFF_CHARS
-    if len(diff) > limit:
-        diff = diff[:limit] + "\n[commit-buddy] Diff truncated for size.\n"
     return diff
 
 @mcp.tool()
@@ -147,28 +582,20 @@ def generate_commit_message(
 ) -> str:
     """Generate a Conventional Commits–style message from git diff via OpenAI."""
     repo = ensure_repo(path)
-    args = ["diff", "--staged"] if staged_only else ["diff"]
-    diff = run_git(args, cwd=repo)
-    if not diff:
+    message = _generate_from_repo(repo, staged_only, language, model, temperature)
+    if message is None:
         return "[commit-buddy] No changes detected; nothing to describe."
-
-    diff = redact_secrets(diff)
-    if len(diff) > MAX_DIFF_CHARS:
-        diff = diff[:MAX_DIFF_CHARS] + "\n[commit-buddy] Diff truncated for size.\n"
-
-    mdl = model or DEFAULT_OPENAI_MODEL
-    temp = OPENAI_TEMPERATURE if temperature is None else float(temperature)
-    message = openai_generate_commit_message(diff=diff, language=language, model=mdl, temperature=temp)
     return message
 
 @mcp.tool()
-def commit_and_push(
+async def commit_and_push(
     path: str = ".",                  # The path to the git repository (default: current directory)
     message: str = "",                # The commit message to use; if empty and generate_if_empty is True, a message will be generated
     # signoff: bool = False,            # Whether to add a Signed-off-by line to the commit
     branch: Optional[str] = None,     # The branch to commit to; if None, uses the current branch
     remote: str = "origin",           # The name of the remote to push to (default: "origin")
     push: bool = True,                # Whether to push after committing (default: True)
+    background_push: bool = True,     # If True, return once committed and push in the background (status goes to a log file)
     allow_main_push: bool = True,    # If False, block pushing directly to main/master branches
     staged_only_for_gen: bool = True, # If True, only use staged changes for message generation; else, use all changes
     dry_run: bool = False,            # If True, show what would happen but do not actually commit or push
@@ -183,16 +610,20 @@ def commit_and_push(
     Safety:
     - Set allow_main_push=false to block pushing to main/master.
     - Set dry_run=true to preview without executing commit/push.
+    - Set background_push=false to wait for the push and report its result directly.
     """
-    repo = ensure_repo(path)
+    # ensure_repo may fork git or hit the filesystem; keep it off the event loop
+    repo = await asyncio.to_thread(ensure_repo, path)
+
+    # Branch, upstream and dirtiness all come from one `git status` call
+    head_branch, upstream, has_changes = await asyncio.to_thread(get_repo_state, repo)
 
     # Ensure there is something to commit
-    status = run_git(["status", "--porcelain"], cwd=repo)
-    if not status:
+    if not has_changes:
         return "[commit-buddy] Nothing to commit."
 
     # Determine branch early for safety checks
-    current_branch = branch or get_current_branch(repo)
+    current_branch = branch or head_branch
 
     # Branch guard
     if push and not allow_main_push and current_branch in ("main", "master"):
@@ -202,46 +633,41 @@ def commit_and_push(
     final_message = (message or "").strip()
     if not final_message:
         # Use the same generator logic as the tool
-        args = ["diff", "--staged"] if staged_only_for_gen else ["diff"]
-        diff = run_git(args, cwd=repo)
-        if not diff:
+        generated = await asyncio.to_thread(
+            _generate_from_repo, repo, staged_only_for_gen, language, model, temperature
+        )
+        if generated is None:
             return "[commit-buddy] No changes detected for message generation."
-        diff = redact_secrets(diff)
-        if len(diff) > MAX_DIFF_CHARS:
-            diff = diff[:MAX_DIFF_CHARS] + "\n[commit-buddy] Diff truncated for size.\n"
-        mdl = model or DEFAULT_OPENAI_MODEL
-        temp = OPENAI_TEMPERATURE if temperature is None else float(temperature)
-        final_message = openai_generate_commit_message(diff=diff, language=language, model=mdl, temperature=temp)
+        final_message = generated
 
     if not final_message:
         raise RuntimeError("Commit message is required (generation disabled or failed).")
 
     if dry_run:
-        return textwrap.dedent(f"""\
-        [commit-buddy] DRY RUN
-        Branch: {current_branch}
-        Remote: {remote}
-        Message:
-        {final_message}
-        (No commit/push executed.)
-        """)
+        return DRY_RUN_TEMPLATE.format(branch=current_branch, remote=remote, message=final_message)
 
     # Commit
     commit_args = ["commit", "-m", final_message]
     # if signoff:
     #     commit_args.append("--signoff")
-    run_git(commit_args, cwd=repo)
+    await run_git_async(commit_args, cwd=repo)
 
     # Optionally push
     if push:
-        if not has_remote(repo, remote):
-            raise RuntimeError(f"Remote '{remote}' not found. Add it with 'git remote add {remote} <url>'.")
-        # Ensure upstream exists
-        try:
-            _ = run_git(["rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}"], cwd=repo)
-            run_git(["push", remote, current_branch], cwd=repo)
-        except Exception:
-            run_git(["push", "--set-upstream", remote, current_branch], cwd=repo)
+        if background_push:
+            sha = await run_git_async(["rev-parse", "--short", "HEAD"], cwd=repo)
+            log_path = Path(tempfile.gettempdir()) / f"commit-buddy-{sha}.log"
+            await asyncio.to_thread(
+                log_path.write_text, f"[commit-buddy] Push to {remote}/{current_branch} in progress.\n"
+            )
+            task = asyncio.create_task(_push_in_background(repo, remote, current_branch, upstream, log_path))
+            _background_pushes.add(task)
+            task.add_done_callback(_background_pushes.discard)
+            return (
+                f"[commit-buddy] Committed on {current_branch}; pushing to {remote}/{current_branch} "
+                f"in background, status at {log_path}"
+            )
+        await _push(repo, remote, current_branch, upstream)
         return f"[commit-buddy] Committed and pushed to {remote}/{current_branch}."
     else:
         return f"[commit-buddy] Committed locally on {current_branch}. Push skipped."